@@ -1,14 +1,46 @@
-from .main import LocalServer
+from .main import LocalServer, logger
 import argparse
+import logging
+import socket
 
 
 def main():
     parser = argparse.ArgumentParser(description="Run local static file server")
     parser.add_argument("-b", "--bind", default="0.0.0.0")
     parser.add_argument("-p", "--port", type=int, default=8000)
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=64,
+        help="number of connections served concurrently (default: 64)",
+    )
+    parser.add_argument(
+        "--reuse-port",
+        action="store_true",
+        help="share the port with other localserver processes (SO_REUSEPORT)",
+    )
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="store_true",
+        help="log every connection and request line",
+    )
     args = parser.parse_args()
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.reuse_port and not hasattr(socket, "SO_REUSEPORT"):
+        parser.error("--reuse-port is not supported on this platform")
 
-    server = LocalServer(host=args.bind, port=args.port)
+    if args.verbose:
+        logger.setLevel(logging.DEBUG)
+
+    server = LocalServer(
+        host=args.bind,
+        port=args.port,
+        max_workers=args.workers,
+        reuse_port=args.reuse_port,
+    )
     server.start_server()
 
 
@@ -1,30 +1,534 @@
+import errno
+import gzip
+import io
+import logging
+import mmap
 import os
+import posixpath
+import queue
+import re
+import select
 import socket
+import stat
+import struct
+import sys
+import threading
+import time
+import zlib
 import mimetypes
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
+from html import escape
+from http import HTTPStatus
+from logging.handlers import QueueHandler, QueueListener
 from email.utils import formatdate  # for RFC compliance
-from typing import Dict, Tuple
+from typing import Dict, Iterator, List, Optional, Set, Tuple, Union
+from urllib.parse import quote, unquote
+
+logger = logging.getLogger("localserver")
+
+
+def _mime(ext: str) -> str:
+    """mime type for a lower-cased file extension"""
+    mime_type, _ = mimetypes.guess_type("x" + ext)
+    return mime_type or "application/octet-stream"
+
+
+@lru_cache(maxsize=1024)
+def _ct_header(ext: str) -> bytes:
+    """encoded Content-Type header line for a lower-cased extension, memoized"""
+    return b"Content-Type: " + _mime(ext).encode("ascii") + b"\r\n"
+
+
+# socket.sendfile() only goes zero-copy through os.sendfile; elsewhere (e.g.
+# windows) it quietly copies in 8 KiB read()/send() steps, which
+# _send_file_fallback does better, so the choice is made up front
+_HAS_SENDFILE = hasattr(os, "sendfile")
+
+# files up to this size are mmap()ed when sendfile() isn't available
+_MMAP_MAX_SIZE = 4 * 1024 * 1024
+
+# files up to this size are read once and sent with their headers in a
+# single write; below this the sendfile() setup costs more than the copy
+_SMALL_FILE_SIZE = 16 * 1024
+
+# read size for larger files when sendfile() isn't available
+_FALLBACK_CHUNK_SIZE = 64 * 1024
+
+# directory listings are written out in chunks of roughly this many characters
+_LISTING_FLUSH_SIZE = 16 * 1024
+
+# how many rendered listings to keep, and the largest one worth keeping
+_LISTING_CACHE_SIZE = 128
+_LISTING_CACHE_MAX_BYTES = 1024 * 1024
+
+# largest request line + headers we're willing to buffer
+_MAX_REQUEST_HEAD = 8192
+
+# the blank line ending a request head; lines may end in a bare LF
+# (RFC 9112 section 2.2), so "\n\n" counts as well as "\r\n\r\n"
+_HEAD_END = re.compile(rb"\n\r?\n")
+
+# seconds to wait for a request, including the next one on a kept-alive
+# connection
+_REQUEST_TIMEOUT = 5
+
+# statuses whose status line is pre-encoded in LocalServer._status_lines
+_COMMON_STATUSES = (
+    HTTPStatus.OK,
+    HTTPStatus.BAD_REQUEST,
+    HTTPStatus.FORBIDDEN,
+    HTTPStatus.NOT_FOUND,
+    HTTPStatus.INTERNAL_SERVER_ERROR,
+)
+
+# immutable on purpose: turned into a new dict for each response that uses it
+_DEFAULT_HEADERS = (("Content-Type", "text/plain;charset=utf-8"),)
+
+# lets headers and the start of a sendfile() body share a segment: TCP_CORK on
+# linux, TCP_NOPUSH (not exported by the socket module) on macOS and the BSDs.
+# its value differs per platform; on openbsd 4 would be TCP_MD5SIG
+if hasattr(socket, "TCP_CORK"):
+    _TCP_CORK: Optional[int] = socket.TCP_CORK
+elif hasattr(socket, "TCP_NOPUSH"):
+    _TCP_CORK = socket.TCP_NOPUSH
+elif sys.platform == "darwin" or sys.platform.startswith("freebsd"):
+    _TCP_CORK = 4
+elif sys.platform.startswith("openbsd"):
+    _TCP_CORK = 0x10
+else:
+    _TCP_CORK = None
+
+# per-worker state; a worker serves one connection from start to finish
+_thread_state = threading.local()
+
+
+def _parse_headers(raw: bytes) -> Dict[str, str]:
+    """header fields of a request head (without the request line), names lower-cased"""
+    headers: Dict[str, str] = {}
+    # split on LF alone; a line's CR goes with the strip() below
+    for line in raw.split(b"\n"):
+        name, sep, value = line.partition(b":")
+        if not sep:
+            continue
+        key = name.strip().lower().decode("latin-1")
+        value_str = value.strip().decode("latin-1")
+        # repeated fields are equivalent to one comma-separated field
+        headers[key] = f"{headers[key]}, {value_str}" if key in headers else value_str
+    return headers
+
+
+def _accepts_gzip(accept_encoding: str) -> bool:
+    """whether an Accept-Encoding value allows a gzip response"""
+    # an explicit gzip entry decides; "*" only stands in when there is none
+    wildcard: Optional[bool] = None
+    for coding in accept_encoding.split(","):
+        name, *params = coding.split(";")
+        name = name.strip().lower()
+        if name not in ("gzip", "*"):
+            continue
+        allowed = True
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    allowed = float(value) > 0
+                except ValueError:
+                    allowed = False
+        if name == "gzip":
+            return allowed
+        wildcard = allowed
+    return bool(wildcard)
+
+
+def _normalize_url_path(path: str) -> str:
+    """collapse '.' segments and repeated slashes, keeping a trailing slash"""
+    # normpath keeps a leading "//", so the root is re-added by hand
+    normalized = "/" + posixpath.normpath(path).lstrip("/")
+    if path.endswith("/") and normalized != "/":
+        normalized += "/"
+    return normalized
+
+
+def _stat(path: str) -> Optional[os.stat_result]:
+    """os.stat(), or None wherever os.path.isfile/isdir would report False"""
+    try:
+        return os.stat(path)
+    except (OSError, ValueError):
+        return None
+
+
+@contextmanager
+def _corked(client_socket: socket.socket) -> Iterator[None]:
+    """hold back partial segments until the block ends, then flush them"""
+    if _TCP_CORK is None:
+        yield
+        return
+    client_socket.setsockopt(socket.IPPROTO_TCP, _TCP_CORK, 1)
+    try:
+        yield
+    finally:
+        client_socket.setsockopt(socket.IPPROTO_TCP, _TCP_CORK, 0)
+
+
+def _send_parts(client_socket: socket.socket, *parts: bytes) -> None:
+    """write parts back to back, gathered into one sendmsg() where supported"""
+    if not hasattr(client_socket, "sendmsg"):  # e.g. windows
+        client_socket.sendall(b"".join(parts))
+        return
+
+    # no concatenated copy: the kernel reads each buffer in place
+    buffers = [memoryview(part) for part in parts if part]
+    while buffers:
+        sent = client_socket.sendmsg(buffers)
+        # drop what was written; a short write can stop mid-buffer
+        while sent:
+            if sent >= len(buffers[0]):
+                sent -= len(buffers.pop(0))
+            else:
+                buffers[0] = buffers[0][sent:]
+                sent = 0
+
+
+def _chunk(data: bytes) -> bytes:
+    """frame data as a single chunk of a chunked transfer-encoded body"""
+    return b"%x\r\n%s\r\n" % (len(data), data)
+
+
+def _thread_buffer(name: str, size: int) -> bytearray:
+    """scratch buffer owned by the calling worker thread, reused across requests"""
+    buf = getattr(_thread_state, name, None)
+    if buf is None or len(buf) != size:
+        buf = bytearray(size)
+        setattr(_thread_state, name, buf)
+    return buf
+
+
+# whether the connection survives the current response is kept per thread
+# rather than passed through every handler
+def _keep_alive() -> bool:
+    """whether the connection being served stays open after this response"""
+    return getattr(_thread_state, "keep_alive", False)
+
+
+def _close_connection() -> None:
+    """close the connection being served once the current response is out"""
+    _thread_state.keep_alive = False
+
+
+# served once at _STYLESHEET_PATH and cached by the browser, so error pages and
+# listings don't carry the whole theme in every response
+_STYLESHEET_PATH = "/_style.css"
+_STYLESHEET = """/* error pages */
+body.error {
+    background: radial-gradient(circle at center, #0f0f1a, #050510);
+    color: #f0f0ff;
+    font-family: 'Orbitron', sans-serif;
+    display: flex;
+    flex-direction: column;
+    justify-content: center;
+    align-items: center;
+    height: 100vh;
+    margin: 0;
+    overflow: hidden;
+}
+.error h1 {
+    font-size: 4rem;
+    color: #ff00ff;
+    text-shadow: 0 0 10px #ff00ff, 0 0 30px #ff00ff, 0 0 60px #ff00ff;
+    animation: errorFlicker 3s infinite;
+}
+.error p {
+    font-size: 1.2rem;
+    color: #00ffff;
+    text-shadow: 0 0 10px #00ffff;
+}
+.error a {
+    color: #00ffcc;
+    text-decoration: none;
+    border: 1px solid #00ffcc;
+    padding: 10px 20px;
+    margin-top: 20px;
+    border-radius: 10px;
+    transition: 0.3s;
+    box-shadow: 0 0 10px #00ffcc;
+}
+.error a:hover {
+    background: #00ffcc;
+    color: #0b0b17;
+    box-shadow: 0 0 20px #00ffcc, 0 0 40px #00ffcc;
+}
+@keyframes errorFlicker {
+    0%, 19%, 21%, 23%, 25%, 54%, 56%, 100% { opacity: 1; }
+    20%, 24%, 55% { opacity: 0.6; }
+}
+@keyframes moveStars {
+    from { background-position: 0 0; }
+    to { background-position: 10000px 10000px; }
+}
+body.error::after {
+    content: "";
+    position: fixed;
+    top: 0; left: 0;
+    width: 200%;
+    height: 200%;
+    background: transparent url("data:image/svg+xml,\
+    <svg xmlns='http://www.w3.org/2000/svg' width='3' height='3'>\
+    <circle cx='1' cy='1' r='1' fill='white' opacity='0.15'/>\
+    </svg>") repeat;
+    background-size: 3px 3px;
+    animation: moveStars 300s linear infinite;
+    opacity: 0.1;
+    z-index: -2;
+}
+
+/* directory listings */
+body.listing {
+    background: linear-gradient(135deg, #0d0221, #1b0033, #050510);
+    font-family: 'Orbitron', sans-serif;
+    margin: 0;
+    padding: 40px;
+    color: #f5e1ff;
+    overflow-x: hidden;
+}
+.listing h1 {
+    color: #ff00ff;
+    text-shadow: 0 0 10px #ff00ff, 0 0 30px #ff00ff;
+    font-size: 2.5rem;
+    animation: flicker 4s infinite;
+}
+.listing ul {
+    list-style-type: none;
+    padding: 0;
+}
+.listing li {
+    margin: 10px 0;
+}
+.listing a {
+    color: #00ffff;
+    text-decoration: none;
+    font-size: 1.1rem;
+    text-shadow: 0 0 5px #00ffff, 0 0 10px #00ffff;
+    transition: 0.3s;
+}
+.listing a:hover {
+    color: #ff00ff;
+    text-shadow: 0 0 15px #ff00ff, 0 0 40px #ff00ff;
+    transform: scale(1.1);
+}
+.listing .size {
+    color: #aaa;
+}
+.container {
+    background: rgba(20, 20, 40, 0.6);
+    border: 2px solid transparent;
+    border-radius: 15px;
+    padding: 30px;
+    box-shadow: 0 0 20px #ff00ff55, 0 0 40px #00ffff22 inset;
+    border-image: linear-gradient(45deg, #ff00ff, #00ffff, #ff00ff) 1;
+    animation: borderShift 5s linear infinite;
+}
+.footer {
+    margin-top: 40px;
+    color: #888;
+    font-size: 0.9rem;
+    text-align: center;
+}
+@keyframes flicker {
+    0%, 18%, 22%, 25%, 53%, 57%, 100% { opacity: 1; }
+    20%, 24%, 55% { opacity: 0.6; }
+}
+@keyframes borderShift {
+    0% { border-image: linear-gradient(45deg, #ff00ff, #00ffff, #ff00ff) 1; }
+    50% { border-image: linear-gradient(45deg, #00ffff, #ff00ff, #00ffff) 1; }
+    100% { border-image: linear-gradient(45deg, #ff00ff, #00ffff, #ff00ff) 1; }
+}
+@keyframes gridMove {
+    from { background-position: 0 0, 0 0; }
+    to { background-position: 100px 100px, 100px 100px; }
+}
+body.listing::before {
+    content: "";
+    position: fixed;
+    top: 0; left: 0;
+    width: 100%; height: 100%;
+    background:
+        linear-gradient(90deg, rgba(255, 0, 255, 0.05) 1px, transparent 1px),
+        linear-gradient(0deg, rgba(0, 255, 255, 0.05) 1px, transparent 1px);
+    background-size: 40px 40px;
+    animation: gridMove 20s linear infinite;
+    z-index: -1;
+}
+""".encode("utf-8")
+
+# pre-compressed once for clients that accept gzip
+_STYLESHEET_GZ = gzip.compress(_STYLESHEET, 9, mtime=0)
+
+# linux MSG_ZEROCOPY (4.14+); the socket module doesn't export these
+_ZEROCOPY = sys.platform == "linux"
+_SO_ZEROCOPY = 60
+_MSG_ZEROCOPY = 0x4000000
+_SO_EE_ORIGIN_ZEROCOPY = 5
+# struct sock_extended_err: errno, origin, type, code, pad, info, data
+_SOCK_EXTENDED_ERR = struct.Struct("=IBBBBII")
+# below ~10 KB pinning pages and reaping completions costs more than the copy
+_ZEROCOPY_MIN_SIZE = 16 * 1024
+
+
+class _ZerocopyPending:
+    """zerocopy sends on one socket whose completion hasn't been read yet"""
+
+    __slots__ = ("sock", "sends", "completed", "bodies")
+
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.sends = 0
+        self.completed = 0
+        # buffers the kernel may still be reading from
+        self.bodies: List[bytes] = []
+
+
+# static parts of the error page and directory listing, encoded once at import
+_ERROR_PAGE_HEAD = """<html>
+<head>
+    <title>""".encode("utf-8")
+_ERROR_PAGE_INTRO = f"""</title>
+    <link rel="stylesheet" href="{_STYLESHEET_PATH}">
+</head>
+<body class="error">
+    <h1>""".encode("utf-8")
+_ERROR_PAGE_TAIL = """</h1>
+    <p>Oops! Something broke the neon grid...</p>
+    <a href="/">Return to Home</a>
+</body>
+</html>
+""".encode("utf-8")
+
+_LISTING_HEAD = """<html>
+<head>
+    <title>Index of """.encode("utf-8")
+_LISTING_INTRO = f"""</title>
+    <link rel="stylesheet" href="{_STYLESHEET_PATH}">
+</head>
+<body class="listing">
+    <div class="container">
+        <h1 id="title">📂 Index of """.encode("utf-8")
+_LISTING_BODY = """</h1>
+        <ul>
+""".encode("utf-8")
+_LISTING_TAIL = """        </ul>
+        <div class="footer">🌐 2049</div>
+    </div>
+    <script>
+    // textContent throughout: the title holds a path the client chose, and
+    // reading it back as text undoes the server-side escaping
+    let el = document.getElementById("title");
+    let text = el.textContent;
+    el.textContent = "";
+    let i = 0;
+    function type() {
+        if (i < text.length) {
+            el.textContent = text.slice(0, i + 1) + "_";
+            i++;
+            setTimeout(type, 80);
+        } else {
+            el.textContent = text;
+        }
+    }
+    type();
+    </script>
+</body>
+</html>
+""".encode("utf-8")
 
 
 class LocalServer:
     def __init__(
-        self, host: str = "0.0.0.0", port: int = 8000, http_version: str = "HTTP/1.1"
+        self,
+        host: str = "0.0.0.0",
+        port: int = 8000,
+        http_version: str = "HTTP/1.1",
+        max_workers: int = 64,
+        reuse_port: bool = False,
     ):
         self.http_version = http_version
         self.host = host
         self.port = port
-        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self.server_socket.bind((self.host, self.port))
+        # read the system mime.types files now rather than on the first request
+        if not mimetypes.inited:
+            mimetypes.init()
+        # resolved once; every request path is checked against this root
+        self._cwd = os.path.realpath(os.getcwd())
+        # status lines for the responses we send most, keyed by (code, reason)
+        self._status_lines = {
+            (status.value, status.phrase): (
+                f"{http_version} {status.value} {status.phrase}\r\n".encode("ascii")
+            )
+            for status in _COMMON_STATUSES
+        }
+        self._common_headers = b"Connection: close\r\nServer: localserver\r\n"
+        self._keep_alive_headers = (
+            b"Connection: keep-alive\r\n"
+            b"Keep-Alive: timeout=%d\r\n"
+            b"Server: localserver\r\n" % _REQUEST_TIMEOUT
+        )
+        self._max_workers = max_workers
+        # accepted connections not yet finished, queued ones included; kept-
+        # alive connections are only held open while there are spare workers
+        self._connections = 0
+        self._connections_lock = threading.Lock()
+        # sockets being served, so shutdown can wake workers waiting on them
+        self._clients: Set[socket.socket] = set()
+        self._stopping = threading.Event()
+        # rendered listings keyed by (dir, request path, dir mtime), LRU first;
+        # each value is [page, gzipped page or None until first asked for]
+        self._listing_cache: "OrderedDict[Tuple[str, str, int], List[Optional[bytes]]]" = (
+            OrderedDict()
+        )
+        self._listing_cache_lock = threading.Lock()
+        # (second, formatted Date header) for the last second a response was sent
+        self._date_cache = (0, "")
+        # bounded so a connection burst queues up instead of spawning a thread each
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="localserver"
+        )
+        self._reuse_port = reuse_port
+        # created and bound by start_listening, so a LocalServer used only to
+        # build responses (as the tests do) never holds a port
+        self.server_socket: Optional[socket.socket] = None
+
+    def _http_date(self) -> str:
+        """RFC 1123 date for the Date header, formatted at most once a second"""
+        now = int(time.time())
+        cached_at, value = self._date_cache
+        if now != cached_at:
+            value = formatdate(now, usegmt=True)
+            self._date_cache = (now, value)
+        return value
+
+    def _connection_headers(self) -> bytes:
+        """Connection and Server headers for the connection being served"""
+        return self._keep_alive_headers if _keep_alive() else self._common_headers
+
+    def _status_line(self, status_code: int, msg: str) -> bytes:
+        """encoded status line, from the prebuilt table when it's a common one"""
+        status_line = self._status_lines.get((status_code, msg))
+        if status_line is None:
+            status_line = f"{self.http_version} {status_code} {msg}\r\n".encode("utf-8")
+        return status_line
 
     def get_default_response_context(
         self,
         status_code: int = 200,
         msg: str = "OK",
         content: str = "OK",
-        response_headers: Dict[str, str] = None,  # pyright: ignore[reportArgumentType]
+        response_headers: Optional[Dict[str, str]] = None,
     ) -> Tuple[str, int, str, str, Dict]:
         if response_headers is None:
-            response_headers = {"Content-Type": "text/plain;charset=utf-8"}
+            # a fresh dict per call; callers are free to mutate it
+            response_headers = dict(_DEFAULT_HEADERS)
         return self.http_version, status_code, msg, content, response_headers
 
     def send_file_response(
@@ -33,44 +537,110 @@ class LocalServer:
         file_path: str,
         status_code: int = 200,
         msg: str = "OK",
+        method: str = "GET",
+        file_stat: Optional[os.stat_result] = None,
     ) -> None:
+        """send a file; file_stat, if given, sizes a HEAD response (a GET
+        fstat()s the file it opens instead)"""
         try:
-            with open(file_path, "rb") as f:
-                # get file size for Content-Length
-                f.seek(0, os.SEEK_END)
-                file_size = f.tell()
-                f.seek(0)
-
-                # get mime type
-                mime_type, _ = mimetypes.guess_type(file_path)
-                if mime_type is None:
-                    mime_type = "application/octet-stream"
-
-                response_headers = {
-                    "Content-Type": mime_type,
-                    "Content-Length": str(file_size),
-                    "Connection": "close",
-                }
+            if method == "HEAD":
+                # headers only: a stat gives the length, the file is never opened
+                if file_stat is None:
+                    file_stat = os.stat(file_path)
+                file_size = file_stat.st_size
+                client_socket.sendall(
+                    self._file_response_header(file_path, file_size, status_code, msg)
+                )
+                return
 
-                headers_formatted = "\r\n".join(
-                    f"{key}: {value}" for key, value in response_headers.items()
+            with open(file_path, "rb") as f:
+                # get file size for Content-Length; one fstat instead of two seeks.
+                # not taken from file_stat: an editor saving by rename can
+                # swap the file between that stat and this open
+                file_size = os.fstat(f.fileno()).st_size
+                response_header = self._file_response_header(
+                    file_path, file_size, status_code, msg
                 )
 
-                # send headers
-                response_header = f"{self.http_version} {status_code} {msg}\r\n{headers_formatted}\r\n\r\n"
-                client_socket.sendall(response_header.encode())
+                if file_size <= _SMALL_FILE_SIZE:
+                    # tiny assets: one read, then headers and body in one write
+                    body = f.read(file_size)
+                    if len(body) != file_size:
+                        # truncated since the fstat: the body falls short of
+                        # Content-Length, so only closing can end it
+                        _close_connection()
+                    _send_parts(client_socket, response_header, body)
+                    return
 
-                # send file content
-                while True:
-                    chunk = f.read(8192)  # read file content in chunks
-                    if not chunk:
-                        break
-                    client_socket.sendall(chunk)
+                # cork the socket so the headers go out in the same segment
+                # as the first bytes of the file instead of on their own
+                with _corked(client_socket):
+                    # send headers
+                    client_socket.sendall(response_header)
 
+                    # send file content, zero-copy where the platform allows it
+                    if _HAS_SENDFILE:
+                        sent = client_socket.sendfile(f, offset=0, count=file_size)
+                    else:
+                        sent = self._send_file_fallback(client_socket, f, file_size)
+                    if sent != file_size:
+                        # truncated since the fstat; see above
+                        _close_connection()
+
+        except (BrokenPipeError, ConnectionResetError):
+            # client hung up mid-download; nobody is left to answer
+            _close_connection()
+            logger.info("Client disconnected while sending %s", file_path)
         except Exception as e:
-            print(f"Error sending file {file_path}: {e}")
+            # the headers may already be out, so this connection is done
+            _close_connection()
+            logger.error("Error sending file %s: %s", file_path, e)
             self.send_error_response(client_socket, 500, "Internal Server Error")
 
+    def _file_response_header(
+        self, file_path: str, file_size: int, status_code: int, msg: str
+    ) -> bytes:
+        """status line and headers for a file body of file_size bytes"""
+        return b"".join(
+            [
+                self._status_line(status_code, msg),
+                b"Date: " + self._http_date().encode("ascii") + b"\r\n",
+                _ct_header(os.path.splitext(file_path)[1].lower()),
+                b"Content-Length: %d\r\n" % file_size,
+                self._connection_headers(),
+                b"\r\n",
+            ]
+        )
+
+    def _send_file_fallback(
+        self, client_socket: socket.socket, f: io.BufferedReader, file_size: int
+    ) -> int:
+        """send a file body without sendfile(): mapped if small, else in chunks;
+        returns the number of bytes sent"""
+        if 0 < file_size <= _MMAP_MAX_SIZE:
+            # the kernel pages the file in as the socket consumes it, no
+            # read() calls or intermediate bytes objects
+            with mmap.mmap(f.fileno(), file_size, access=mmap.ACCESS_READ) as mm:
+                if hasattr(mmap, "MADV_SEQUENTIAL"):
+                    mm.madvise(mmap.MADV_SEQUENTIAL)
+                client_socket.sendall(mm)
+            return file_size
+
+        # read into the worker's own buffer rather than a fresh bytes per chunk
+        buf = _thread_buffer("file", _FALLBACK_CHUNK_SIZE)
+        f.seek(0)
+        # stop at the announced length even if the file has grown since the
+        # stat, as sendfile(count=file_size) does
+        remaining = file_size
+        with memoryview(buf) as view:
+            while remaining:
+                n = f.readinto(view[: min(remaining, len(buf))])
+                if not n:
+                    break
+                client_socket.sendall(view[:n])
+                remaining -= n
+        return file_size - remaining
+
     def send_headers_only(
         self,
         client_socket: socket.socket,
@@ -79,211 +649,279 @@ class LocalServer:
         msg: str,
     ) -> None:
         try:
-            formatted_headers = "\r\n".join(
-                f"{key}: {value}" for key, value in response_headers.items()
+            formatted_headers = "".join(
+                f"{key}: {value}\r\n" for key, value in response_headers.items()
+            )
+            client_socket.sendall(
+                b"".join(
+                    [
+                        self._status_line(status_code, msg),
+                        formatted_headers.encode("utf-8"),
+                        self._connection_headers(),
+                        b"\r\n",
+                    ]
+                )
             )
-
-            header_response = f"{self.http_version} {status_code} {msg}\r\n{formatted_headers}\r\n\r\n"
-            client_socket.sendall(header_response.encode("utf-8"))
         except Exception as e:
-            print(f"Error sending headers: {e}")
+            _close_connection()
+            logger.error("Error sending headers: %s", e)
             self.send_error_response(client_socket, 500, "Internal Server Error")
 
-        finally:
-            del formatted_headers, header_response
-
     def send_response(
         self,
         client_socket: socket.socket,
         response_headers: Dict[str, str],
         status_code: int,
         msg: str,
-        content: str,
+        content: Union[str, bytes],
+        method: str = "GET",
     ) -> None:
         try:
-            # add Content-Length and connection headers
-            content_bytes = content.encode("utf-8")
-            response_headers["Content-Length"] = str(len(content_bytes))
-            response_headers["Connection"] = "close"
+            if isinstance(content, bytes):
+                content_bytes = content
+            else:
+                content_bytes = content.encode("utf-8")
 
-            formatted_headers = "\r\n".join(
-                f"{key}: {value}" for key, value in response_headers.items()
+            # only the caller's headers and the length are formatted per
+            # response; the status line and the shared headers are prebuilt
+            extra_headers = "".join(
+                f"{key}: {value}\r\n" for key, value in response_headers.items()
             )
-
-            response = f"{self.http_version} {status_code} {msg}\r\n{formatted_headers}\r\n\r\n"
-            client_socket.sendall(response.encode("utf-8"))
-            client_socket.sendall(content_bytes)
+            header_bytes = b"".join(
+                [
+                    self._status_line(status_code, msg),
+                    extra_headers.encode("utf-8"),
+                    b"Content-Length: %d\r\n" % len(content_bytes),
+                    self._connection_headers(),
+                    b"\r\n",
+                ]
+            )
+            if method == "HEAD":
+                # a HEAD response carries the GET headers, Content-Length included
+                client_socket.sendall(header_bytes)
+            elif (
+                _ZEROCOPY
+                and len(content_bytes) >= _ZEROCOPY_MIN_SIZE
+                and hasattr(client_socket, "recvmsg")
+                and self._send_zerocopy(client_socket, header_bytes, content_bytes)
+            ):
+                pass
+            else:
+                # one write for headers and body: a single syscall, and the
+                # headers share a segment with the start of the body
+                _send_parts(client_socket, header_bytes, content_bytes)
         except Exception as e:
-            print(f"Error sending response: {e}")
+            # part of the response may be out; the connection can't be reused
+            _close_connection()
+            logger.error("Error sending response: %s", e)
 
-        finally:
-            del content_bytes, formatted_headers, response
+    def _send_zerocopy(
+        self, client_socket: socket.socket, header_bytes: bytes, body: bytes
+    ) -> bool:
+        """send body with MSG_ZEROCOPY after the headers, False if the socket
+        can't do that (and nothing was sent)"""
+        try:
+            client_socket.setsockopt(socket.SOL_SOCKET, _SO_ZEROCOPY, 1)
+        except OSError:
+            return False
+
+        # the headers are small and copied as usual; MSG_MORE holds them back
+        # so they go out in the same segment as the start of the body
+        client_socket.sendall(header_bytes, socket.MSG_MORE)
+
+        pending = getattr(_thread_state, "zerocopy", None)
+        if pending is not None and pending.sock is not client_socket:
+            self._finish_zerocopy()
+            pending = None
+        if pending is None:
+            pending = _thread_state.zerocopy = _ZerocopyPending(client_socket)
+        else:
+            # free the bodies of earlier responses that are already through
+            self._reap_zerocopy(pending, block=False)
+
+        view = memoryview(body)
+        while view:
+            try:
+                sent = client_socket.send(view, _MSG_ZEROCOPY)
+            except OSError as e:
+                # out of optmem for pinned pages; copy the rest instead
+                if e.errno != errno.ENOBUFS:
+                    raise
+                client_socket.sendall(view)
+                break
+            view = view[sent:]
+            pending.sends += 1
+
+        # the kernel reads straight out of body until the peer has ACKed it,
+        # so it is kept alive until then; waiting for that here would hold the
+        # worker for a round trip, so completions are read later instead
+        pending.bodies.append(body)
+        return True
+
+    def _reap_zerocopy(self, pending: "_ZerocopyPending", block: bool) -> None:
+        """read zerocopy completion notifications for pending's socket; with
+        block, until every send so far is complete"""
+        client_socket = pending.sock
+        timeout = client_socket.gettimeout() if block else 0
+        poller = select.poll()
+        poller.register(client_socket, select.POLLERR)
+
+        while pending.completed < pending.sends:
+            if not poller.poll(None if timeout is None else timeout * 1000):
+                if block:
+                    raise socket.timeout("timed out waiting for zerocopy completion")
+                break
+            try:
+                _, ancdata, _, _ = client_socket.recvmsg(
+                    0, socket.CMSG_SPACE(64), socket.MSG_ERRQUEUE
+                )
+            except BlockingIOError:
+                # POLLERR without a queued notification: a real socket error
+                error = client_socket.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                if error:
+                    raise OSError(error, os.strerror(error))
+                if not block:
+                    break
+                continue
+
+            for _level, _type, data in ancdata:
+                _, origin, _, _, _, first, last = _SOCK_EXTENDED_ERR.unpack_from(data)
+                if origin == _SO_EE_ORIGIN_ZEROCOPY:
+                    # notifications cover an inclusive range of send counters
+                    pending.completed += ((last - first) & 0xFFFFFFFF) + 1
+
+        if pending.completed >= pending.sends:
+            pending.bodies.clear()
+
+    def _finish_zerocopy(self) -> None:
+        """wait out this worker's outstanding zerocopy sends, before their
+        socket is closed or another one takes over"""
+        pending = getattr(_thread_state, "zerocopy", None)
+        if pending is None:
+            return
+        _thread_state.zerocopy = None
+        try:
+            self._reap_zerocopy(pending, block=True)
+        except (OSError, ValueError):
+            # socket already closed or broken; nothing more will be reported
+            pass
 
     def send_error_response(
-        self, client_socket: socket.socket, status_code: int, message: str
+        self,
+        client_socket: socket.socket,
+        status_code: int,
+        message: str,
+        method: str = "GET",
     ):
-        """send error response"""
+        """send error response; for HEAD, the same headers without the page"""
+        if status_code >= 500:
+            # whatever failed may have left part of a response on the wire
+            _close_connection()
         try:
-            content = f"""
-            <html>
-            <head>
-                <title>{status_code} {message}</title>
-                <style>
-                    body {{
-                        background: radial-gradient(circle at center, #0f0f1a, #050510);
-                        color: #f0f0ff;
-                        font-family: 'Orbitron', sans-serif;
-                        display: flex;
-                        flex-direction: column;
-                        justify-content: center;
-                        align-items: center;
-                        height: 100vh;
-                        margin: 0;
-                        overflow: hidden;
-                    }}
-                    h1 {{
-                        font-size: 4rem;
-                        color: #ff00ff;
-                        text-shadow: 0 0 10px #ff00ff, 0 0 30px #ff00ff, 0 0 60px #ff00ff;
-                        animation: flicker 3s infinite;
-                    }}
-                    p {{
-                        font-size: 1.2rem;
-                        color: #00ffff;
-                        text-shadow: 0 0 10px #00ffff;
-                    }}
-                    a {{
-                        color: #00ffcc;
-                        text-decoration: none;
-                        border: 1px solid #00ffcc;
-                        padding: 10px 20px;
-                        margin-top: 20px;
-                        border-radius: 10px;
-                        transition: 0.3s;
-                        box-shadow: 0 0 10px #00ffcc;
-                    }}
-                    a:hover {{
-                        background: #00ffcc;
-                        color: #0b0b17;
-                        box-shadow: 0 0 20px #00ffcc, 0 0 40px #00ffcc;
-                    }}
-                    @keyframes flicker {{
-                        0%, 19%, 21%, 23%, 25%, 54%, 56%, 100% {{ opacity: 1; }}
-                        20%, 24%, 55% {{ opacity: 0.6; }}
-                    }}
-                    @keyframes moveStars {{
-                        from {{ background-position: 0 0; }}
-                        to {{ background-position: 10000px 10000px; }}
-                    }}
-                    body::after {{
-                        content: "";
-                        position: fixed;
-                        top: 0; left: 0;
-                        width: 200%;
-                        height: 200%;
-                        background: transparent url("data:image/svg+xml,\
-                        <svg xmlns='http://www.w3.org/2000/svg' width='3' height='3'>\
-                        <circle cx='1' cy='1' r='1' fill='white' opacity='0.15'/>\
-                        </svg>") repeat;
-                        background-size: 3px 3px;
-                        animation: moveStars 300s linear infinite;
-                        opacity: 0.1;
-                        z-index: -2;
-                    }}
-                </style>
-            </head>
-            <body>
-                <h1>{status_code} {message}</h1>
-                <p>Oops! Something broke the neon grid...</p>
-                <a href="/">Return to Home</a>
-            </body>
-            </html>
-            """
+            title = f"{status_code} {message}".encode("utf-8")
+            content = b"".join(
+                [_ERROR_PAGE_HEAD, title, _ERROR_PAGE_INTRO, title, _ERROR_PAGE_TAIL]
+            )
             response_headers = {"Content-Type": "text/html;charset=utf-8"}
             self.send_response(
-                client_socket, response_headers, status_code, message, content
+                client_socket,
+                response_headers,
+                status_code,
+                message,
+                content,
+                method=method,
             )
         except Exception as e:
-            print(f"Error sending error response: {e}")
+            _close_connection()
+            logger.error("Error sending error response: %s", e)
 
-    def handle_head_request(self, abs_path: str, client_socket: socket.socket):
+    def handle_head_request(
+        self,
+        abs_path: str,
+        client_socket: socket.socket,
+        request_path: str = "/",
+        http_version: str = "HTTP/1.1",
+        accept_gzip: bool = False,
+    ):
+        """handles head request: the headers a GET would get, without a body"""
         try:
-            """handles head request"""
-            if os.path.isfile(abs_path):
-                file_size = os.path.getsize(abs_path)
-
-                # get mime type
-                mime_type, _ = mimetypes.guess_type(abs_path)
-                if mime_type is None:
-                    mime_type = "application/octet-stream"
-
-                headers = {
-                    "Date": str(formatdate(timeval=None, localtime=False, usegmt=True)),
-                    "Content-Length": str(file_size),
-                    "Content-Type": mime_type,
-                    "Connection": "close",
-                }
+            if request_path == _STYLESHEET_PATH:
+                self._send_stylesheet(client_socket, accept_gzip, "HEAD")
+                return
 
-                self.send_headers_only(
-                    client_socket,
-                    headers,
-                    200,
-                    "OK",
+            # one stat decides file, directory or 404 and is handed on
+            st = _stat(abs_path)
+            if st is not None and stat.S_ISREG(st.st_mode):
+                self.send_file_response(
+                    client_socket, abs_path, method="HEAD", file_stat=st
                 )
 
-            elif os.path.isdir(abs_path):
-                # get mime type
-                mime_type, _ = mimetypes.guess_type(abs_path)
-                if mime_type is None:
-                    mime_type = "application/octet-stream"
-
-                headers = {
-                    "Date": str(formatdate(timeval=None, localtime=False, usegmt=True)),
-                    "Content-Type": mime_type,
-                    "Content-Length": 0,
-                    "Connection": "close",
-                }
-
-                self.send_headers_only(
+            elif st is not None and stat.S_ISDIR(st.st_mode):
+                self.handle_directory_listing(
                     client_socket,
-                    headers,
-                    200,
-                    "OK",
+                    abs_path,
+                    request_path,
+                    http_version,
+                    accept_gzip,
+                    method="HEAD",
+                    dir_stat=st,
                 )
 
             else:
-                headers = {
-                    "Date": str(formatdate(timeval=None, localtime=False, usegmt=True)),
-                    "Content-Length": 0,
-                    "Content-Type": "text/html;charset=utf-8",
-                    "Connection": "close",
-                }
-                self.send_headers_only(
-                    client_socket,
-                    headers,
-                    404,
-                    "Not Found",
-                )
+                self.send_error_response(client_socket, 404, "Not Found", "HEAD")
 
         except PermissionError:
-            self.send_error_response(client_socket, 403, "Forbidden")
+            self.send_error_response(client_socket, 403, "Forbidden", "HEAD")
+
+    def _send_stylesheet(
+        self, client_socket: socket.socket, accept_gzip: bool, method: str = "GET"
+    ) -> None:
+        """serve the shared page stylesheet, pre-compressed if the client allows"""
+        response_headers = {
+            "Content-Type": "text/css;charset=utf-8",
+            "Cache-Control": "public, max-age=86400",
+            "Vary": "Accept-Encoding",
+        }
+        stylesheet = _STYLESHEET
+        if accept_gzip:
+            response_headers["Content-Encoding"] = "gzip"
+            stylesheet = _STYLESHEET_GZ
+        self.send_response(
+            client_socket, response_headers, 200, "OK", stylesheet, method=method
+        )
 
     def handle_get_request(
         self,
         request_path: str,
         abs_path: str,
         client_socket: socket.socket,
+        http_version: str = "HTTP/1.1",
+        accept_gzip: bool = False,
     ):
         """handle get request"""
 
+        if request_path == _STYLESHEET_PATH:
+            self._send_stylesheet(client_socket, accept_gzip)
+            return
+
         if request_path == "/favicon.ico":
             self.send_error_response(client_socket, 404, "Not Found")
             return
 
-        if os.path.isdir(abs_path):
-            self.handle_directory_listing(client_socket, abs_path, request_path)
+        # one stat decides directory, file or 404 and is handed on
+        st = _stat(abs_path)
+        if st is not None and stat.S_ISDIR(st.st_mode):
+            self.handle_directory_listing(
+                client_socket,
+                abs_path,
+                request_path,
+                http_version,
+                accept_gzip,
+                dir_stat=st,
+            )
 
-        elif os.path.isfile(abs_path):
+        elif st is not None and stat.S_ISREG(st.st_mode):
+            # no file_stat: a GET takes its length from the opened file
             self.send_file_response(client_socket, abs_path)
 
         else:
@@ -294,174 +932,229 @@ class LocalServer:
         client_socket: socket.socket,
         request_path: str,
         method: str,
+        http_version: str = "HTTP/1.1",
+        accept_gzip: bool = False,
     ) -> None:
         try:
-            # decode url encoded paths
-            request_path = request_path.replace("%20", " ")  # "%20" is space
-            print(request_path)
+            # the query string never names a file; drop it before decoding so
+            # an encoded %3F stays part of the name
+            request_path = unquote(request_path.partition("?")[0])
+            if "\x00" in request_path:  # os calls reject embedded NULs
+                self.send_error_response(client_socket, 400, "Bad Request", method)
+                return
             clean_path = request_path.lstrip("/")
-            abs_path = os.path.abspath(os.path.join(os.getcwd(), clean_path))
+
+            # a ".." segment can only climb out of the root; refuse it before
+            # touching the filesystem
+            if ".." in clean_path.split("/"):
+                self.send_error_response(client_socket, 403, "Forbidden", method)
+                return
+
+            abs_path = os.path.realpath(os.path.join(self._cwd, clean_path))
 
             # check if path is within current directory to avoid lookbacks to prarent dirs
-            if not abs_path.startswith(os.getcwd()):
-                self.send_error_response(client_socket, 403, "Forbidden")
+            try:
+                is_inside = os.path.commonpath([abs_path, self._cwd]) == self._cwd
+            except ValueError:  # e.g. different drives on windows
+                is_inside = False
+            if not is_inside:
+                self.send_error_response(client_socket, 403, "Forbidden", method)
                 return
 
             if method == "HEAD":
-                self.handle_head_request(abs_path, client_socket)
+                self.handle_head_request(
+                    abs_path, client_socket, request_path, http_version, accept_gzip
+                )
 
             elif method == "GET":
-                self.handle_get_request(request_path, abs_path, client_socket)
+                self.handle_get_request(
+                    request_path, abs_path, client_socket, http_version, accept_gzip
+                )
 
         except Exception as e:
-            print(f"Error handling request: {e}")
-            self.send_error_response(client_socket, 500, "Internal Server Error")
+            logger.error("Error handling request: %s", e)
+            self.send_error_response(
+                client_socket, 500, "Internal Server Error", method
+            )
 
     def handle_directory_listing(
-        self, client_socket: socket.socket, dir_path: str, request_path: str = "/"
+        self,
+        client_socket: socket.socket,
+        dir_path: str,
+        request_path: str = "/",
+        http_version: str = "HTTP/1.1",
+        accept_gzip: bool = False,
+        method: str = "GET",
+        dir_stat: Optional[os.stat_result] = None,
     ):
-        """directory listing"""
+        """directory listing, streamed so large directories are never held in memory"""
+        # "/d/", "/d/./" and "/d//" are one page, rendered and cached once
+        request_path = _normalize_url_path(request_path)
         try:
-            files_and_dirs = os.listdir(dir_path)
-            files_and_dirs.sort()
-
-            response_headers = {"Content-Type": "text/html;charset=utf-8"}
-
-            content = f"""
-            <html>
-            <head>
-                <title>Index of {request_path}</title>
-                <style>
-                    body {{
-                        background: linear-gradient(135deg, #0d0221, #1b0033, #050510);
-                        font-family: 'Orbitron', sans-serif;
-                        margin: 0;
-                        padding: 40px;
-                        color: #f5e1ff;
-                        overflow-x: hidden;
-                    }}
-                    h1 {{
-                        color: #ff00ff;
-                        text-shadow: 0 0 10px #ff00ff, 0 0 30px #ff00ff;
-                        font-size: 2.5rem;
-                        animation: flicker 4s infinite;
-                    }}
-                    ul {{
-                        list-style-type: none;
-                        padding: 0;
-                    }}
-                    li {{
-                        margin: 10px 0;
-                    }}
-                    a {{
-                        color: #00ffff;
-                        text-decoration: none;
-                        font-size: 1.1rem;
-                        text-shadow: 0 0 5px #00ffff, 0 0 10px #00ffff;
-                        transition: 0.3s;
-                    }}
-                    a:hover {{
-                        color: #ff00ff;
-                        text-shadow: 0 0 15px #ff00ff, 0 0 40px #ff00ff;
-                        transform: scale(1.1);
-                    }}
-                    .container {{
-                        background: rgba(20, 20, 40, 0.6);
-                        border: 2px solid transparent;
-                        border-radius: 15px;
-                        padding: 30px;
-                        box-shadow: 0 0 20px #ff00ff55, 0 0 40px #00ffff22 inset;
-                        border-image: linear-gradient(45deg, #ff00ff, #00ffff, #ff00ff) 1;
-                        animation: borderShift 5s linear infinite;
-                    }}
-                    .footer {{
-                        margin-top: 40px;
-                        color: #888;
-                        font-size: 0.9rem;
-                        text-align: center;
-                    }}
-                    @keyframes flicker {{
-                        0%, 18%, 22%, 25%, 53%, 57%, 100% {{ opacity: 1; }}
-                        20%, 24%, 55% {{ opacity: 0.6; }}
-                    }}
-                    @keyframes borderShift {{
-                        0% {{ border-image: linear-gradient(45deg, #ff00ff, #00ffff, #ff00ff) 1; }}
-                        50% {{ border-image: linear-gradient(45deg, #00ffff, #ff00ff, #00ffff) 1; }}
-                        100% {{ border-image: linear-gradient(45deg, #ff00ff, #00ffff, #ff00ff) 1; }}
-                    }}
-                    @keyframes gridMove {{
-                        from {{ background-position: 0 0, 0 0; }}
-                        to {{ background-position: 100px 100px, 100px 100px; }}
-                    }}
-                    body::before {{
-                        content: "";
-                        position: fixed;
-                        top: 0; left: 0;
-                        width: 100%; height: 100%;
-                        background:
-                            linear-gradient(90deg, rgba(255, 0, 255, 0.05) 1px, transparent 1px),
-                            linear-gradient(0deg, rgba(0, 255, 255, 0.05) 1px, transparent 1px);
-                        background-size: 40px 40px;
-                        animation: gridMove 20s linear infinite;
-                        z-index: -1;
-                    }}
-                </style>
-            </head>
-            <body>
-                <div class="container">
-                    <h1 id="title">📂 Index of {request_path}</h1>
-                    <ul>
-            """
-
-            # parent directory
-            if request_path != "/":
-                parent_path = "/".join(request_path.rstrip("/").split("/")[:-1]) or "/"
-                content += f'<li>⬆️ <a href="{parent_path}">Parent Directory</a></li>'
-
-            for item in files_and_dirs:
-                item_url = request_path.rstrip("/") + "/" + item
-                item_path = os.path.join(dir_path, item)
-                if os.path.isdir(item_path):
-                    content += f'<li>📁 <a href="{item_url}/">{item}/</a></li>'
-                else:
-                    try:
-                        size = os.path.getsize(item_path)
-                        size_str = self.format_file_size(size)
-                        content += f'<li>📄 <a href="{item_url}">{item}</a> — <span style="color:#aaa;">{size_str}</span></li>'
-                    except OSError:
-                        content += f'<li>📄 <a href="{item_url}">{item}</a></li>'
-
-            content += """
-                    </ul>
-                    <div class="footer">🌐 2049</div>
-                </div>
-                <script>
-                let text = document.getElementById("title").innerText;
-                let el = document.getElementById("title");
-                el.innerText = "";
-                let i = 0;
-                function type() {
-                    if (i < text.length) {{
-                        el.innerHTML = text.slice(0, i + 1) + "_";
-                        i++;
-                        setTimeout(type, 80);
-                    }} else {{
-                        el.innerHTML = text;
-                    }}
+            # the rendered page only changes when an entry is added, removed
+            # or renamed, all of which bump the directory's mtime
+            if dir_stat is None:
+                dir_stat = os.stat(dir_path)
+            cache_key = (dir_path, request_path, dir_stat.st_mtime_ns)
+            cached = self._cached_listing(cache_key, accept_gzip)
+            if cached is not None:
+                response_headers = {
+                    "Content-Type": "text/html;charset=utf-8",
+                    "Vary": "Accept-Encoding",
                 }
-                type();
-                </script>
-            </body>
-            </html>
-            """
+                if accept_gzip:
+                    response_headers["Content-Encoding"] = "gzip"
+                self.send_response(
+                    client_socket, response_headers, 200, "OK", cached, method=method
+                )
+                return
 
-            self.send_response(client_socket, response_headers, 200, "OK", content)
+            if method == "HEAD":
+                # not worth rendering the page just to measure it; answer with
+                # the headers the streamed GET would carry
+                client_socket.sendall(self._listing_header(http_version, accept_gzip))
+                return
 
+            # scandir hands back d_type with each entry, so is_dir() needs no stat
+            with os.scandir(dir_path) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
         except PermissionError:
-            self.send_error_response(client_socket, 403, "Forbidden")
+            self.send_error_response(client_socket, 403, "Forbidden", method)
+            return
         except Exception as e:
-            print(f"Error listing directory {dir_path}: {e}")
-            self.send_error_response(client_socket, 500, "Internal Server Error")
+            logger.error("Error listing directory %s: %s", dir_path, e)
+            self.send_error_response(
+                client_socket, 500, "Internal Server Error", method
+            )
+            return
+
+        # HTTP/1.0 clients don't understand chunked bodies; for them the body
+        # simply ends when the connection is closed
+        chunked = http_version != "HTTP/1.0"
+        # wbits=31 makes zlib write a gzip header and trailer around the stream
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if accept_gzip else None
+
+        def encode(data: bytes, last: bool = False) -> bytes:
+            """compress and frame a piece of the body for the wire"""
+            if compressor is not None:
+                data = compressor.compress(data)
+                if last:
+                    data += compressor.flush()
+            # an empty chunk would end the body early, so never send one
+            framed = (_chunk(data) if chunked else data) if data else b""
+            if last and chunked:
+                framed += b"0\r\n\r\n"
+            return framed
+
+        try:
+            header_bytes = self._listing_header(http_version, accept_gzip)
+            title = escape(request_path).encode("utf-8")
+            page_head = b"".join(
+                [_LISTING_HEAD, title, _LISTING_INTRO, title, _LISTING_BODY]
+            )
+            client_socket.sendall(header_bytes + encode(page_head))
+
+            # keep a copy of what's sent for the cache, unless the page
+            # turns out too big to be worth holding on to
+            sent = [page_head]
+            sent_size = len(page_head)
+
+            # entries are flushed in batches rather than one write per <li>
+            parts = []
+            pending = 0
+            for item in self._listing_items(entries, request_path):
+                parts.append(item)
+                pending += len(item)
+                if pending >= _LISTING_FLUSH_SIZE:
+                    data = "".join(parts).encode("utf-8")
+                    wire = encode(data)
+                    if wire:
+                        client_socket.sendall(wire)
+                    parts = []
+                    pending = 0
+                    if sent is not None:
+                        sent.append(data)
+                        sent_size += len(data)
+                        if sent_size > _LISTING_CACHE_MAX_BYTES:
+                            sent = None
+
+            tail = "".join(parts).encode("utf-8") + _LISTING_TAIL
+            client_socket.sendall(encode(tail, last=True))
+
+            if sent is not None:
+                sent.append(tail)
+                self._store_listing(cache_key, b"".join(sent))
+
+        except Exception as e:
+            # the status line is already out, all we can do is drop the connection
+            _close_connection()
+            logger.error("Error listing directory %s: %s", dir_path, e)
+
+    def _listing_header(self, http_version: str, gzipped: bool) -> bytes:
+        """status line and headers for a streamed directory listing"""
+        if http_version == "HTTP/1.0":
+            # no chunked framing, so closing the connection ends the body
+            _close_connection()
+        return b"".join(
+            [
+                self._status_line(200, "OK"),
+                b"Content-Type: text/html;charset=utf-8\r\n",
+                b"Vary: Accept-Encoding\r\n",
+                b"Content-Encoding: gzip\r\n" if gzipped else b"",
+                b"Transfer-Encoding: chunked\r\n" if http_version != "HTTP/1.0" else b"",
+                self._connection_headers(),
+                b"\r\n",
+            ]
+        )
+
+    def _cached_listing(
+        self, cache_key: Tuple[str, str, int], gzipped: bool = False
+    ) -> Optional[bytes]:
+        """rendered listing for cache_key, if it's still cached"""
+        with self._listing_cache_lock:
+            cached = self._listing_cache.get(cache_key)
+            if cached is None:
+                return None
+            self._listing_cache.move_to_end(cache_key)
+
+        if not gzipped:
+            return cached[0]
+        if cached[1] is None:
+            # compressed on first use; two threads racing here both produce
+            # the same bytes, so the lost write doesn't matter
+            cached[1] = gzip.compress(cached[0], 6)
+        return cached[1]
+
+    def _store_listing(self, cache_key: Tuple[str, str, int], body: bytes) -> None:
+        """cache a rendered listing, evicting the least recently used one"""
+        with self._listing_cache_lock:
+            self._listing_cache[cache_key] = [body, None]
+            self._listing_cache.move_to_end(cache_key)
+            if len(self._listing_cache) > _LISTING_CACHE_SIZE:
+                self._listing_cache.popitem(last=False)
+
+    def _listing_items(self, entries, request_path: str):
+        """yield the <li> markup for each entry of a directory listing"""
+        # hrefs are percent-encoded so names with '#', '?' or spaces survive
+        # the round trip; shown names are html-escaped
+        base_url = quote(request_path.rstrip("/"))
+        # parent directory
+        if request_path != "/":
+            parent_path = "/".join(base_url.split("/")[:-1]) or "/"
+            yield f'<li>⬆️ <a href="{parent_path}">Parent Directory</a></li>'
+
+        for entry in entries:
+            item = escape(entry.name)
+            item_url = base_url + "/" + quote(entry.name)
+            if entry.is_dir():
+                yield f'<li>📁 <a href="{item_url}/">{item}/</a></li>'
+            else:
+                try:
+                    size = entry.stat().st_size
+                    size_str = self.format_file_size(size)
+                    yield f'<li>📄 <a href="{item_url}">{item}</a> — <span class="size">{size_str}</span></li>'
+                except OSError:
+                    yield f'<li>📄 <a href="{item_url}">{item}</a></li>'
 
     def format_file_size(self, size_bytes: float) -> str:
         """Format file size in human readable format"""
@@ -476,97 +1169,270 @@ class LocalServer:
 
         return f"{size_bytes:.1f} {size_names[i]}"
 
+    def _ensure_socket(self) -> socket.socket:
+        """the bound listening socket, created on first use"""
+        if self.server_socket is None:
+            server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            try:
+                server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                # opt-in: lets several server processes share the port, with
+                # the kernel spreading connections between them. Off by
+                # default so a second server started by mistake fails instead
+                # of taking half the traffic
+                if self._reuse_port and hasattr(socket, "SO_REUSEPORT"):
+                    server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+                server_socket.bind((self.host, self.port))
+            except OSError:
+                server_socket.close()
+                raise
+            self.server_socket = server_socket
+        return self.server_socket
+
     def start_listening(self) -> None:
-        self.server_socket.listen(5)
+        # room for connection bursts while the workers are busy
+        self._ensure_socket().listen(1024)
 
     def accept_connections(self):
+        server_socket = self._ensure_socket()
         try:
             while True:
-                client_socket, client_address = self.server_socket.accept()
-                print(f"Connection from {client_address}")
-
-                try:
-                    # Set socket timeout to prevent hanging
-                    client_socket.settimeout(5.0)
-
-                    request = client_socket.recv(4096).decode("utf-8")
-                    if not request.strip():
-                        print("Empty request received")
-                        self.send_error_response(
-                            client_socket, 400, "Empty Request Received"
-                        )
-                        continue
-
-                    # Parse request line
-                    request_lines = request.split("\r\n")
-                    if not request_lines:
-                        print("No request line found")
-                        continue
-
-                    request_line = request_lines[0].strip()
-                    if not request_line:
-                        print("Empty request line")
-                        continue
-
-                    request_parts = request_line.split()
-                    if len(request_parts) != 3:
-                        print(f"Invalid request format: {request_line}")
-                        self.send_error_response(client_socket, 400, "Bad Request")
-                        continue
-
-                    method, path, http_version = request_parts
-                    print(f"Request: {method} {path} {http_version}")
-
-                    # handle GET & HEAD requests
-                    if method not in {"HEAD", "GET"}:
-                        self.send_error_response(
-                            client_socket, 501, "Method Not Allowed"
-                        )
-                        continue
-
-                    # handle the request
-                    self.handle_request(client_socket, path, method)
-
-                except socket.timeout:
-                    print("Client connection timed out")
-                except Exception as e:
-                    print(f"Error handling client connection: {e}")
-                    try:
-                        self.send_error_response(
-                            client_socket, 500, "Internal Server Error"
-                        )
-                    except:  # noqa: E722
-                        pass
-                finally:
-                    # close the client socket
-                    try:
-                        client_socket.close()
-                    except:  # noqa: E722
-                        pass
+                client_socket, client_address = server_socket.accept()
+                with self._connections_lock:
+                    self._connections += 1
+                # hand the client to a worker so a slow client doesn't hold up
+                # the accept loop
+                self._pool.submit(self._serve_one, client_socket, client_address)
 
         except KeyboardInterrupt:
-            print("\nShutting down server...")
+            logger.info("\nShutting down server...")
+        except Exception as e:
+            logger.error("Server error: %s", e)
+        finally:
+            self._stop(server_socket)
+            logger.info("Server closed.")
+
+    def _stop(self, server_socket: socket.socket) -> None:
+        """stop listening and let every worker finish its current response"""
+        self._stopping.set()
+        try:
+            server_socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass  # e.g. not connected, on some platforms
+        try:
+            server_socket.close()
+        except:  # noqa: E722
+            pass
+        self.server_socket = None
+
+        # a worker waiting for the next request on a kept-alive connection
+        # would otherwise sit out its timeout; shutting down the read side
+        # makes that recv return at once without cutting off a response
+        with self._connections_lock:
+            clients = list(self._clients)
+        for client_socket in clients:
+            try:
+                client_socket.shutdown(socket.SHUT_RD)
+            except OSError:
+                pass
+
+        # connections still queued for a worker are dropped, not served
+        if sys.version_info >= (3, 9):
+            self._pool.shutdown(wait=False, cancel_futures=True)
+        else:
+            self._pool.shutdown(wait=False)
+
+    def _read_request_head(
+        self, client_socket: socket.socket, pending: Optional[bytearray] = None
+    ) -> Optional[bytes]:
+        """read until the blank line ending the request head, None if it's too big
+
+        pending carries bytes read past the previous head on a kept-alive
+        connection; whatever is read past this head is left in it
+        """
+        # recv straight into the worker's buffer; only the head itself is copied
+        buf = _thread_buffer("recv", _MAX_REQUEST_HEAD)
+        received = 0
+        if pending:
+            received = len(pending)
+            buf[:received] = pending
+            pending.clear()
+        search_from = 0
+        with memoryview(buf) as view:
+            while True:
+                match = _HEAD_END.search(buf, search_from, received)
+                if match is not None:
+                    head_end = match.end()
+                    if pending is not None:
+                        pending += view[head_end:received]
+                    return bytes(view[:head_end])
+                if received >= _MAX_REQUEST_HEAD:
+                    # buffer full and still no blank line
+                    return None
+
+                n = client_socket.recv_into(view[received:])
+                if not n:
+                    # client stopped sending; parse whatever arrived
+                    return bytes(view[:received])
+                # the terminator may straddle the previous read
+                search_from = max(0, received - 3)
+                received += n
+
+    def _serve_one(self, client_socket: socket.socket, client_address) -> None:
+        """serve requests on one client connection until either side closes it"""
+        # per-request lines are debug: with the default INFO level each one
+        # costs a single isEnabledFor() check
+        logger.debug("Connection from %s", client_address)
+
+        try:
+            # Set socket timeout to prevent hanging
+            client_socket.settimeout(_REQUEST_TIMEOUT)
+            # responses are written in full before we wait on the client, so
+            # Nagle would only delay the tail segment until the peer ACKs
+            client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            with self._connections_lock:
+                self._clients.add(client_socket)
+            pending = bytearray()
+            first = True
+            while not self._stopping.is_set() and self._serve_request(
+                client_socket, pending, first
+            ):
+                first = False
+
+        except socket.timeout:
+            logger.warning("Client connection timed out")
         except Exception as e:
-            print(f"Server error: {e}")
+            logger.error("Error handling client connection: %s", e)
+            try:
+                self.send_error_response(client_socket, 500, "Internal Server Error")
+            except:  # noqa: E722
+                pass
         finally:
+            _close_connection()
+            self._finish_zerocopy()
+            with self._connections_lock:
+                self._connections -= 1
+                self._clients.discard(client_socket)
+            # close the client socket
             try:
-                self.server_socket.close()
+                client_socket.close()
             except:  # noqa: E722
                 pass
-            print("Server closed.")
+
+    def _serve_request(
+        self, client_socket: socket.socket, pending: bytearray, first: bool
+    ) -> bool:
+        """read and answer one request, True if the connection stays open"""
+        # anything answered before the request is validated closes the connection
+        _close_connection()
+        try:
+            request = self._read_request_head(client_socket, pending)
+        except socket.timeout:
+            if first:
+                raise
+            return False  # idle kept-alive connection
+
+        if request is None:
+            logger.warning("Request head too large")
+            self.send_error_response(
+                client_socket, 431, "Request Header Fields Too Large"
+            )
+            return False
+
+        if not request.strip():
+            if first:
+                logger.warning("Empty request received")
+                self.send_error_response(client_socket, 400, "Empty Request Received")
+            # otherwise the client just closed a kept-alive connection
+            return False
+
+        # Parse request line; only it is needed to dispatch, so the
+        # headers after it are never decoded
+        line_end = request.find(b"\n")
+        request_line = (request if line_end == -1 else request[:line_end]).rstrip(b"\r")
+
+        request_parts = request_line.split()
+        if len(request_parts) != 3:
+            logger.warning("Invalid request format: %r", request_line)
+            self.send_error_response(client_socket, 400, "Bad Request")
+            return False
+
+        try:
+            method = request_parts[0].decode("ascii")
+            # clients such as curl send non-ASCII paths unencoded; take
+            # them as UTF-8, the same charset unquote() decodes %XX into
+            path = request_parts[1].decode("utf-8")
+            http_version = request_parts[2].decode("ascii")
+        except UnicodeDecodeError:
+            logger.warning("Undecodable request line: %r", request_line)
+            self.send_error_response(client_socket, 400, "Bad Request")
+            return False
+
+        logger.debug("Request: %s %s %s", method, path, http_version)
+
+        headers = _parse_headers(request[line_end + 1 :]) if line_end != -1 else {}
+        accept_gzip = _accepts_gzip(headers.get("accept-encoding", ""))
+
+        # handle GET & HEAD requests
+        if method not in {"HEAD", "GET"}:
+            self.send_error_response(client_socket, 501, "Method Not Allowed")
+            return False
+
+        # HTTP/1.1 connections persist unless the client opts out, 1.0 ones
+        # only if it opts in. A request body is never read, so it would be
+        # taken for the next request; and a connection is only held while
+        # no accepted one is waiting for a worker
+        connection = {
+            token.strip().lower() for token in headers.get("connection", "").split(",")
+        }
+        if http_version == "HTTP/1.1":
+            keep_alive = "close" not in connection
+        else:
+            keep_alive = "keep-alive" in connection
+        has_body = "transfer-encoding" in headers or headers.get(
+            "content-length", "0"
+        ).strip() not in ("", "0")
+        _thread_state.keep_alive = (
+            keep_alive
+            and not has_body
+            and self._connections <= self._max_workers
+            and not self._stopping.is_set()
+        )
+
+        # handle the request
+        self.handle_request(client_socket, path, method, http_version, accept_gzip)
+        return _keep_alive()
+
+    def _start_logging(self) -> QueueListener:
+        """hand log records to a background thread so workers never wait on stdout"""
+        log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        console = logging.StreamHandler(sys.stdout)
+        console.setFormatter(logging.Formatter("%(message)s"))
+        listener = QueueListener(log_queue, console)
+
+        logger.addHandler(QueueHandler(log_queue))
+        if logger.level == logging.NOTSET:  # keep a level set by the caller
+            logger.setLevel(logging.INFO)
+        logger.propagate = False
+        listener.start()
+        return listener
 
     def start_server(self):
+        listener = self._start_logging()
         try:
             self.start_listening()
-            print(f"Server listening on http://{self.host}:{self.port}")
+            logger.info("Server listening on http://%s:%s", self.host, self.port)
             self.accept_connections()
         except OSError as e:
             if e.errno == 98:  # address already in use
-                print(f"Error: Port {self.port} is already in use.")
+                logger.error("Error: Port %s is already in use.", self.port)
             else:
-                print(f"Error starting server: {e}")
+                logger.error("Error starting server: %s", e)
         except Exception as e:
-            print(f"Unexpected error: {e}")
+            logger.error("Unexpected error: %s", e)
+        finally:
+            # flushes whatever is still queued
+            listener.stop()
 
 
 if __name__ == "__main__":
@@ -1,5 +1,9 @@
+import gzip
+import os
+import socket
+import threading
 from pathlib import Path
-from localserver.main import LocalServer
+from localserver.main import LocalServer, _accepts_gzip
 
 
 def test_server_init():
@@ -28,17 +32,32 @@ class DummySocket:
     """
 
     def __init__(self):
-        self.data = b""
+        # bytearray so appends stay cheap for large bodies
+        self.data = bytearray()
         self.file_sent = None
 
     def send(self, data):
-        self.data += data
+        self.data.extend(data)
+        return len(data)
 
     def sendall(self, data):
-        self.data += data
+        self.data.extend(data)
 
-    def sendfile(self, file_obj):
-        self.file_sent = file_obj.read()
+    def setsockopt(self, level, optname, value):
+        pass
+
+    def sendfile(self, file_obj, offset=0, count=None):
+        file_obj.seek(offset)
+        self.file_sent = file_obj.read() if count is None else file_obj.read(count)
+        self.data.extend(self.file_sent)
+        return len(self.file_sent)
+
+
+class NoSendfileSocket(DummySocket):
+    """DummySocket that fails if sendfile() is used, for the fallback tests"""
+
+    def sendfile(self, file_obj, offset=0, count=None):
+        raise AssertionError("sendfile() used without os.sendfile")
 
 
 def test_send_response():
@@ -58,6 +77,8 @@ def test_send_file_response():
     server.send_file_response(dummy, file_path, 200, "OK")  # type: ignore
 
     assert b"This is a test file." in dummy.data
+    # small files skip sendfile() and go out with their headers
+    assert dummy.file_sent is None
 
 
 def test_handle_head_request_for_file():
@@ -81,9 +102,14 @@ def test_handle_head_request_missing_file():
     dummy = DummySocket()
 
     server.handle_request(dummy, "/nonexistent.txt", "HEAD")  # pyright: ignore[reportArgumentType]
+    get = DummySocket()
+    server.handle_request(get, "/nonexistent.txt", "GET")  # pyright: ignore[reportArgumentType]
 
+    # the headers GET gets, error page length included, and no page
     assert b"404 Not Found" in dummy.data
-    assert b"Content-Length: 0" in dummy.data
+    assert bytes(get.data).startswith(bytes(dummy.data))
+    assert dummy.data.endswith(b"\r\n\r\n")
+    assert b"<html>" not in dummy.data
 
 
 def test_handle_get_request_for_file():
@@ -106,3 +132,548 @@ def test_handle_get_request_missing_file():
     server.handle_request(dummy, "/missing.txt", "GET")  # pyright: ignore[reportArgumentType]
 
     assert b"404 Not Found" in dummy.data
+
+
+def test_send_file_response_falls_back_without_sendfile(monkeypatch):
+    monkeypatch.setattr("localserver.main._HAS_SENDFILE", False)
+    monkeypatch.setattr("localserver.main._SMALL_FILE_SIZE", 0)
+    file_path = Path("test.txt")
+    file_path.write_text("fallback content")
+
+    server = LocalServer()
+    dummy = NoSendfileSocket()
+    server.send_file_response(dummy, file_path, 200, "OK")  # type: ignore
+
+    assert b"200 OK" in dummy.data
+    assert b"fallback content" in dummy.data
+
+
+def test_handle_request_rejects_sibling_prefix_dir(tmp_path, monkeypatch):
+    root = tmp_path / "root"
+    root.mkdir()
+    (tmp_path / "rootevil").mkdir()
+    (tmp_path / "rootevil" / "secret.txt").write_text("secret")
+    (root / "link").symlink_to(tmp_path / "rootevil")
+    monkeypatch.chdir(root)
+
+    server = LocalServer()
+    dummy = DummySocket()
+
+    server.handle_request(dummy, "/link/secret.txt", "GET")  # pyright: ignore[reportArgumentType]
+
+    assert b"403 Forbidden" in dummy.data
+    assert b"secret" not in dummy.data
+
+
+def test_handle_get_request_lists_directory(tmp_path, monkeypatch):
+    (tmp_path / "docs").mkdir()
+    (tmp_path / "b.txt").write_text("bb")
+    (tmp_path / "a.txt").write_text("a")
+    monkeypatch.chdir(tmp_path)
+
+    server = LocalServer()
+    dummy = DummySocket()
+
+    server.handle_request(dummy, "/", "GET")  # pyright: ignore[reportArgumentType]
+
+    assert b"200 OK" in dummy.data
+    assert b'<a href="/docs/">docs/</a>' in dummy.data
+    assert dummy.data.index(b"a.txt") < dummy.data.index(b"b.txt")
+    assert b"2.0 B" in dummy.data
+
+
+def test_error_page_links_shared_stylesheet():
+    server = LocalServer()
+    dummy = DummySocket()
+
+    server.send_error_response(dummy, 404, "Not Found")  # type: ignore
+
+    assert b'<link rel="stylesheet" href="/_style.css">' in dummy.data
+    assert b"<style>" not in dummy.data
+
+    dummy = DummySocket()
+    server.handle_request(dummy, "/_style.css", "GET")  # pyright: ignore[reportArgumentType]
+
+    assert b"200 OK" in dummy.data
+    assert b"Content-Type: text/css" in dummy.data
+    assert b"body.error" in dummy.data
+
+
+def test_handle_get_request_decodes_percent_escapes(tmp_path, monkeypatch):
+    (tmp_path / "report (final).txt").write_text("escaped name")
+    monkeypatch.chdir(tmp_path)
+
+    server = LocalServer()
+    dummy = DummySocket()
+
+    server.handle_request(dummy, "/report%20%28final%29.txt", "GET")  # pyright: ignore[reportArgumentType]
+
+    assert b"200 OK" in dummy.data
+    assert b"escaped name" in dummy.data
+
+
+def test_handle_request_rejects_encoded_parent_segments():
+    server = LocalServer()
+    dummy = DummySocket()
+
+    server.handle_request(dummy, "/%2E%2E/%2E%2E/etc/passwd", "GET")  # pyright: ignore[reportArgumentType]
+
+    assert b"403 Forbidden" in dummy.data
+
+
+def test_default_response_headers_are_not_shared():
+    server = LocalServer()
+
+    first = server.get_default_response_context()[4]
+    first["X-Leak"] = "1"
+    second = server.get_default_response_context()[4]
+
+    assert "X-Leak" not in second
+    assert second == {"Content-Type": "text/plain;charset=utf-8"}
+
+
+def test_send_response_keeps_custom_reason_phrase():
+    server = LocalServer()
+    dummy = DummySocket()
+
+    server.send_error_response(dummy, 400, "Empty Request Received")  # type: ignore
+
+    assert dummy.data.startswith(b"HTTP/1.1 400 Empty Request Received\r\n")
+    assert b"Connection: close\r\n" in dummy.data
+
+
+def test_directory_listing_is_chunked_for_http11_only(tmp_path):
+    (tmp_path / "a.txt").write_text("a")
+    server = LocalServer()
+
+    dummy = DummySocket()
+    server.handle_directory_listing(dummy, str(tmp_path), "/")  # type: ignore
+    assert b"Transfer-Encoding: chunked" in dummy.data
+    assert b"Content-Length" not in dummy.data
+    assert dummy.data.endswith(b"\r\n0\r\n\r\n")
+
+    dummy = DummySocket()
+    server.handle_directory_listing(dummy, str(tmp_path), "/", "HTTP/1.0")  # type: ignore
+    assert b"Transfer-Encoding" not in dummy.data
+    assert dummy.data.endswith(b"</html>\n")
+
+
+def test_send_file_response_fallback_streams_large_files(tmp_path, monkeypatch):
+    monkeypatch.setattr("localserver.main._HAS_SENDFILE", False)
+    monkeypatch.setattr("localserver.main._MMAP_MAX_SIZE", 16)
+    monkeypatch.setattr("localserver.main._SMALL_FILE_SIZE", 16)
+    file_path = tmp_path / "big.bin"
+    file_path.write_bytes(b"0123456789" * 1000)
+
+    server = LocalServer()
+    dummy = NoSendfileSocket()
+    server.send_file_response(dummy, str(file_path))  # type: ignore
+
+    assert dummy.data.endswith(b"0123456789" * 1000)
+
+
+def test_directory_listing_survives_broken_symlink(tmp_path):
+    (tmp_path / "dangling").symlink_to(tmp_path / "gone.txt")
+    (tmp_path / "real.txt").write_text("ok")
+    server = LocalServer()
+    dummy = DummySocket()
+
+    server.handle_directory_listing(dummy, str(tmp_path), "/")  # type: ignore
+
+    assert b"200 OK" in dummy.data
+    assert b'<a href="/dangling">dangling</a></li>' in dummy.data
+    assert b"real.txt" in dummy.data
+
+
+def test_directory_listing_is_cached_until_directory_changes(tmp_path):
+    (tmp_path / "a.txt").write_text("a")
+    server = LocalServer()
+
+    first = DummySocket()
+    server.handle_directory_listing(first, str(tmp_path), "/")  # type: ignore
+    cached = DummySocket()
+    server.handle_directory_listing(cached, str(tmp_path), "/")  # type: ignore
+
+    assert b"Transfer-Encoding: chunked" in first.data
+    assert b"Content-Length" in cached.data
+    assert b"a.txt" in cached.data
+
+    (tmp_path / "b.txt").write_text("b")
+    os.utime(tmp_path, ns=(0, os.stat(tmp_path).st_mtime_ns + 1))
+    fresh = DummySocket()
+    server.handle_directory_listing(fresh, str(tmp_path), "/")  # type: ignore
+
+    assert b"b.txt" in fresh.data
+
+
+class ScriptedSocket(DummySocket):
+    """DummySocket that hands out a fixed sequence of chunks from recv_into()"""
+
+    def __init__(self, chunks):
+        super().__init__()
+        self.chunks = list(chunks)
+
+    def recv_into(self, buffer, nbytes=0):
+        if not self.chunks:
+            return 0
+        chunk = self.chunks.pop(0)
+        n = min(len(chunk), nbytes or len(buffer))
+        buffer[:n] = chunk[:n]
+        if n < len(chunk):  # the rest stays queued, like unread socket data
+            self.chunks.insert(0, chunk[n:])
+        return n
+
+    def settimeout(self, timeout):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_read_request_head_joins_split_segments():
+    server = LocalServer()
+    sock = ScriptedSocket([b"GET /a HT", b"TP/1.1\r\nHost: x\r", b"\n\r\nrest"])
+
+    assert server._read_request_head(sock) == b"GET /a HTTP/1.1\r\nHost: x\r\n\r\n"  # type: ignore
+
+
+def test_read_request_head_rejects_oversized_head():
+    server = LocalServer()
+    sock = ScriptedSocket([b"GET / HTTP/1.1\r\n", b"X: " + b"a" * 9000, b"\r\n\r\n"])
+
+    assert server._read_request_head(sock) is None  # type: ignore
+
+
+def test_accepts_gzip_honours_quality_values():
+    assert _accepts_gzip("gzip, deflate, br")
+    assert _accepts_gzip("br;q=1.0, *;q=0.5")
+    assert not _accepts_gzip("gzip;q=0")
+    assert not _accepts_gzip("identity")
+    assert not _accepts_gzip("")
+
+
+def test_accepts_gzip_prefers_explicit_entry_over_wildcard():
+    assert _accepts_gzip("*;q=0, gzip")
+    assert not _accepts_gzip("gzip;q=0, *")
+    assert not _accepts_gzip("*;q=0")
+
+
+def test_accepts_gzip_reads_q_from_any_parameter():
+    assert not _accepts_gzip("gzip;level=9;q=0")
+    assert _accepts_gzip("gzip; foo=bar; q=0.5")
+
+
+def test_directory_listing_gzip_stream(tmp_path):
+    (tmp_path / "a.txt").write_text("a")
+    server = LocalServer()
+    dummy = DummySocket()
+
+    server.handle_directory_listing(dummy, str(tmp_path), "/", "HTTP/1.0", True)  # type: ignore
+
+    head, _, body = bytes(dummy.data).partition(b"\r\n\r\n")
+    assert b"Content-Encoding: gzip" in head
+    assert b"a.txt" in gzip.decompress(body)
+
+
+def test_send_response_large_body_over_tcp():
+    listener = socket.create_server(("127.0.0.1", 0))
+    client = socket.create_connection(listener.getsockname())
+    conn, _ = listener.accept()
+    conn.settimeout(5.0)
+    body = b"z" * 200_000
+    received = bytearray()
+
+    def drain():
+        while True:
+            chunk = client.recv(65536)
+            if not chunk:
+                break
+            received.extend(chunk)
+
+    reader = threading.Thread(target=drain)
+    reader.start()
+    server = LocalServer()
+    server.send_response(conn, {"Content-Type": "text/plain"}, 200, "OK", body)
+    conn.close()
+    reader.join(5)
+    client.close()
+    listener.close()
+
+    assert received.startswith(b"HTTP/1.1 200 OK\r\n")
+    assert received.endswith(body)
+
+
+def test_handle_head_request_for_directory(tmp_path, monkeypatch):
+    (tmp_path / "a.txt").write_text("a")
+    monkeypatch.chdir(tmp_path)
+    server = LocalServer()
+    dummy = DummySocket()
+
+    server.handle_request(dummy, "/", "HEAD")  # pyright: ignore[reportArgumentType]
+
+    assert b"200 OK" in dummy.data
+    assert b"Content-Type: text/html" in dummy.data
+    assert dummy.data.endswith(b"\r\n\r\n")
+    assert b"a.txt" not in dummy.data
+
+
+def test_send_response_gathers_headers_and_body():
+    server_end, client_end = socket.socketpair()
+    server = LocalServer()
+
+    server.send_response(server_end, {"Content-Type": "text/plain"}, 200, "OK", "gathered")
+    server_end.close()
+    received = b""
+    while True:
+        chunk = client_end.recv(4096)
+        if not chunk:
+            break
+        received += chunk
+    client_end.close()
+
+    assert received.startswith(b"HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\n")
+    assert received.endswith(b"\r\n\r\ngathered")
+
+
+def test_query_string_is_ignored_and_nul_rejected(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "page.txt").write_text("query free")
+    server = LocalServer()
+
+    dummy = DummySocket()
+    server.handle_request(dummy, "/page.txt?v=2", "GET")  # type: ignore
+    assert b"200 OK" in dummy.data
+    assert b"query free" in dummy.data
+
+    dummy = DummySocket()
+    server.handle_request(dummy, "/page.txt%00.png", "GET")  # type: ignore
+    assert b"400 Bad Request" in dummy.data
+
+
+def test_serve_one_accepts_raw_utf8_path(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "café.txt").write_text("raw utf-8")
+    server = LocalServer()
+    sock = ScriptedSocket(["GET /café.txt HTTP/1.1\r\n\r\n".encode("utf-8")])
+
+    server._serve_one(sock, ("127.0.0.1", 0))  # type: ignore
+
+    assert b"200 OK" in sock.data
+    assert b"raw utf-8" in sock.data
+
+
+def test_listing_escapes_names_and_encodes_links(tmp_path, monkeypatch):
+    (tmp_path / "<b>#1 notes.txt").write_text("x")
+    monkeypatch.chdir(tmp_path)
+    server = LocalServer()
+    dummy = DummySocket()
+
+    server.handle_request(dummy, "/", "GET")  # type: ignore
+
+    assert b'<a href="/%3Cb%3E%231%20notes.txt">&lt;b&gt;#1 notes.txt</a>' in dummy.data
+    assert b"<b>#1" not in dummy.data
+
+
+def test_server_binds_only_when_listening():
+    server = LocalServer(host="127.0.0.1", port=0)
+    assert server.server_socket is None
+
+    server.start_listening()
+    try:
+        assert server.server_socket is not None
+        assert server.server_socket.getsockname()[1] != 0
+    finally:
+        server.server_socket.close()  # type: ignore
+
+
+def test_serve_one_keeps_http11_connections_alive(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "one.txt").write_text("first body")
+    server = LocalServer()
+    # two pipelined requests in one segment; the second asks to close
+    sock = ScriptedSocket(
+        [
+            b"GET /one.txt HTTP/1.1\r\nHost: x\r\n\r\n"
+            b"GET /missing HTTP/1.1\r\nHost: x\r\nConnection: close\r\n\r\n"
+        ]
+    )
+
+    server._serve_one(sock, ("127.0.0.1", 0))  # type: ignore
+
+    first, _, second = bytes(sock.data).partition(b"first body")
+    assert first.startswith(b"HTTP/1.1 200 OK\r\n")
+    assert b"Connection: keep-alive\r\n" in first
+    assert second.startswith(b"HTTP/1.1 404 Not Found\r\n")
+    assert b"Connection: close\r\n" in second
+
+
+def test_listing_script_never_writes_page_text_as_html(tmp_path, monkeypatch):
+    (tmp_path / "<img src=x onerror=alert(1)>").mkdir()
+    monkeypatch.chdir(tmp_path)
+    server = LocalServer()
+    dummy = DummySocket()
+
+    server.handle_request(dummy, "/%3Cimg%20src=x%20onerror=alert(1)%3E/", "GET")  # type: ignore
+
+    page = bytes(dummy.data)
+    assert b"<img src=x" not in page
+    script = page[page.index(b"<script>") : page.index(b"</script>")]
+    assert b"innerHTML" not in script
+    assert b"innerText" not in script
+
+
+def test_stop_releases_idle_kept_alive_connections(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "a.txt").write_text("a")
+    server = LocalServer(host="127.0.0.1", port=0)
+    server.start_listening()
+    listener = server.server_socket
+    client = socket.create_connection(listener.getsockname())  # type: ignore
+    conn, address = listener.accept()  # type: ignore
+    worker = threading.Thread(target=server._serve_one, args=(conn, address))
+    worker.start()
+
+    client.sendall(b"GET /a.txt HTTP/1.1\r\nHost: x\r\n\r\n")
+    assert b"Connection: keep-alive" in client.recv(4096)
+
+    server._stop(listener)  # type: ignore
+    worker.join(2)
+    client.close()
+
+    # the worker was waiting for a next request that never comes
+    assert not worker.is_alive()
+
+
+def test_fallback_sends_large_files_in_full_size_chunks(tmp_path, monkeypatch):
+    from localserver import main
+
+    monkeypatch.setattr(main, "_HAS_SENDFILE", False)
+    monkeypatch.setattr(main, "_MMAP_MAX_SIZE", 0)
+    body = os.urandom(main._FALLBACK_CHUNK_SIZE * 2 + 100)
+    file_path = tmp_path / "big.bin"
+    file_path.write_bytes(body)
+
+    class RecordingSocket(NoSendfileSocket):
+        def __init__(self):
+            super().__init__()
+            self.writes = []
+
+        def sendall(self, data):
+            self.writes.append(len(data))
+            super().sendall(data)
+
+    server = LocalServer()
+    dummy = RecordingSocket()
+    server.send_file_response(dummy, str(file_path))  # type: ignore
+    first_buffer = main._thread_buffer("file", main._FALLBACK_CHUNK_SIZE)
+    server.send_file_response(RecordingSocket(), str(file_path))  # type: ignore
+
+    # headers, then two full reads and the remainder
+    assert dummy.writes[1:] == [main._FALLBACK_CHUNK_SIZE] * 2 + [100]
+    assert dummy.data.endswith(body)
+    assert main._thread_buffer("file", main._FALLBACK_CHUNK_SIZE) is first_buffer
+
+
+def test_serve_one_accepts_bare_lf_request_head(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "a.txt").write_text("lf only")
+    server = LocalServer()
+    sock = ScriptedSocket([b"GET /a.txt HTTP/1.0\n", b"Accept-Encoding: gzip\n\n"])
+
+    server._serve_one(sock, ("127.0.0.1", 0))  # type: ignore
+
+    assert sock.data.startswith(b"HTTP/1.1 200 OK\r\n")
+    assert sock.data.endswith(b"lf only")
+
+
+def test_listing_cache_key_ignores_dot_segments(tmp_path, monkeypatch):
+    (tmp_path / "d").mkdir()
+    (tmp_path / "d" / "a.txt").write_text("a")
+    monkeypatch.chdir(tmp_path)
+    server = LocalServer()
+
+    for path in ("/d/", "/d/./", "/d/././", "//d//"):
+        dummy = DummySocket()
+        server.handle_request(dummy, path, "GET")  # type: ignore
+        assert b"<title>Index of /d/</title>" in dummy.data
+
+    assert len(server._listing_cache) == 1
+
+
+def test_fallback_stops_at_announced_length_when_file_grows(tmp_path, monkeypatch):
+    from localserver import main
+
+    monkeypatch.setattr(main, "_MMAP_MAX_SIZE", 0)
+    announced = main._FALLBACK_CHUNK_SIZE + 10
+    file_path = tmp_path / "growing.log"
+    # written after the stat that produced `announced`
+    file_path.write_bytes(b"x" * announced + b"appended later")
+
+    server = LocalServer()
+    dummy = NoSendfileSocket()
+    with open(file_path, "rb") as f:
+        server._send_file_fallback(dummy, f, announced)  # type: ignore
+
+    assert bytes(dummy.data) == b"x" * announced
+
+
+def test_truncated_file_closes_kept_alive_connection(tmp_path, monkeypatch):
+    from types import SimpleNamespace
+
+    from localserver import main
+
+    real_fstat = os.fstat
+    # the file loses 100 bytes between the fstat and the send
+    monkeypatch.setattr(
+        main.os,
+        "fstat",
+        lambda fd: SimpleNamespace(st_size=real_fstat(fd).st_size + 100),
+    )
+    server = LocalServer()
+
+    for size in (10, main._SMALL_FILE_SIZE + 10):
+        file_path = tmp_path / f"shrunk-{size}.bin"
+        file_path.write_bytes(b"s" * size)
+        main._thread_state.keep_alive = True
+        try:
+            dummy = DummySocket()
+            server.send_file_response(dummy, str(file_path))  # type: ignore
+            assert b"Content-Length: %d\r\n" % (size + 100) in dummy.data
+            assert not main._keep_alive()
+        finally:
+            main._close_connection()
+
+
+def test_zerocopy_completions_are_collected_after_the_response():
+    from localserver import main
+
+    listener = socket.create_server(("127.0.0.1", 0))
+    client = socket.create_connection(listener.getsockname())
+    conn, _ = listener.accept()
+    conn.settimeout(5.0)
+    body = b"k" * 100_000
+    received = bytearray()
+
+    def drain():
+        while len(received) < len(body):
+            received.extend(client.recv(65536))
+
+    reader = threading.Thread(target=drain)
+    reader.start()
+    server = LocalServer()
+    server.send_response(conn, {}, 200, "OK", body)
+    pending = getattr(main._thread_state, "zerocopy", None)
+    reader.join(5)
+
+    if pending is not None:  # the kernel took the zerocopy path
+        # send_response returned without waiting; the body is held until reaped
+        assert pending.sock is conn
+        assert pending.bodies == [body]
+        server._finish_zerocopy()
+        assert pending.completed == pending.sends
+        assert pending.bodies == []
+        assert main._thread_state.zerocopy is None
+    conn.close()
+    client.close()
+    listener.close()
+    assert received.endswith(body)